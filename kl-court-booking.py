@@ -1,13 +1,19 @@
 import os
-import json
+import orjson
 import hashlib
+import asyncio
 from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import defaultdict
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, Page
+from playwright.async_api import async_playwright, Page
+import httpx
+from selectolax.parser import HTMLParser
 import schedule
-import time
 import re
-from dateutil import parser
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from rate_limit import TELEGRAM_BUCKET
 
 
 # Load .env variables
@@ -17,11 +23,27 @@ CHAT_ID = os.getenv("CHAT_ID")
 DBKL_USER = os.getenv("DBKL_USER")
 DBKL_PASS = os.getenv("DBKL_PASS")
 
-HASH_FILE = "dbkl_last_sent_hash.json"
 SLOT_FILE = "dbkl_last_slots.json"
+AUTH_FILE = "dbkl_auth.json"  # Saved cookies/localStorage of the logged-in session
+PAGE_HASH_FILE = "dbkl_page_hashes.json"  # Raw HTML hash + parsed slot labels per location/date page
+FACILITY_URL = "https://tempahkl.dbkl.gov.my/facility"
+SIGN_IN_URL = "https://tempahkl.dbkl.gov.my/sign-in"
 TARGET_URL_TEMPLATE = "https://tempahkl.dbkl.gov.my/facility/detail/book?location_id={}&start_date={}&sub_category=TENIS&toggle_step=1"
 MAX_BOOKING_DAYS = 22
-TIME_RE = re.compile(r"\d{1,2}:\d{2}\s[AP]M", re.IGNORECASE)
+EARLY_STOP_STREAK = 5  # Stop scanning a location after this many consecutive days without slots
+MIN_SCAN_DAYS = 7  # ...but always scan at least this many days
+HTTP_TIMEOUT = 30  # seconds per booking page request
+MAX_CONCURRENT_REQUESTS = 15  # Stay below DBKL's rate limiter / WAF
+NAVIGATION_TIMEOUT = 15000
+# Shared by the Playwright login and the httpx crawl so the session sees one client
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+# The login page is only used for its form, so skip downloading assets
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+# Patterns below expect lowercased input, which is cheaper than re.IGNORECASE
+HM_RE = re.compile(r"(\d{1,2}):(\d{2})\s*([ap])m")
+COURT_NUM_RE = re.compile(r"(?:court|gelanggang)\s+(\d+)")
+TIME_RANGE_RE = re.compile(r"(\d{1,2}:\d{2}\s*[ap]m)\s*-\s*(\d{1,2}:\d{2}\s*[ap]m)")
+MD_ESCAPE_RE = re.compile(r"([_*!\[\]()~`>#+=|{}\\\-.])")
 
 # Location configuration
 LOCATIONS = {
@@ -35,26 +57,72 @@ LOCATIONS = {
 # Courts to ignore per location (court numbers to exclude)
 # Format: {location_id: [court_numbers_to_ignore]}
 IGNORED_COURTS = {
-    10: [5, 6],
-    # Example: 10: [1, 2],  # Ignore courts 1 and 2 for Titiwangsa
+    10: frozenset({5, 6}),
+    # Example: 10: frozenset({1, 2}),  # Ignore courts 1 and 2 for Titiwangsa
     # Add court numbers you want to ignore for each location
 }
+EMPTY_FS = frozenset()
+
+# One keep-alive connection to Telegram for every message part; Retry backs off on 429/5xx
+# and honours Telegram's Retry-After header
+TELEGRAM_SESSION = requests.Session()
+TELEGRAM_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+))
+
+
+
+def parse_minutes(time_str: str) -> int:
+    """Parse a 'HH:MM AM/PM' string into minutes after midnight
+    Example: '07:30 PM' -> 1170
+    """
+    match = HM_RE.match(time_str.lower())
+    if not match:
+        raise ValueError(f"Invalid time format: {time_str}")
+    hour, minute, meridiem = int(match[1]), int(match[2]), match[3]
+    if meridiem == "p" and hour != 12:
+        hour += 12
+    elif meridiem == "a" and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+def format_minutes(minutes: int) -> str:
+    """Format minutes after midnight as 'H:MM AM/PM'
+    Example: 1170 -> '7:30 PM'
+    """
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'PM' if hour >= 12 else 'AM'}"
 
+@lru_cache(maxsize=64)
+def parse_display_date(display_date: str) -> datetime:
+    """Parse a 'DD/MM/YYYY' date once; the same few dates repeat across locations"""
+    return datetime.strptime(display_date, "%d/%m/%Y")
 
+@lru_cache(maxsize=512)
+def escape_md_v2(text: str) -> str:
+    return MD_ESCAPE_RE.sub(r'\\\1', text)
 
-def parse_start_time(slot: str) -> datetime:
-    match = TIME_RE.search(slot)
-    if not match:
-        raise ValueError(f"Invalid time slot format: {slot}")
-    return datetime.strptime(match.group(), "%I:%M %p")
+# Location names never change, so escape them once at import
+ESCAPED_LOCATIONS = {location_id: escape_md_v2(name) for location_id, name in LOCATIONS.items()}
 
-def escape_md_v2(text):
-    return re.sub(r'([_*!\[\]()~`>#+=|{}\\\-.])', r'\\\1', text)
+@lru_cache(maxsize=None)
+def format_minutes_md(minutes: int) -> str:
+    """MarkdownV2-escaped format_minutes; slot times come from a small fixed set"""
+    return escape_md_v2(format_minutes(minutes))
 
 
 def send_telegram_message(text: str):
-    import requests
     MAX_MESSAGE_LENGTH = 4000  # Leave some buffer below the 4096 limit
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     
     # If message is short enough, send as single message
     if len(text) <= MAX_MESSAGE_LENGTH:
@@ -64,46 +132,46 @@ def send_telegram_message(text: str):
             "text": text,
             "parse_mode": "MarkdownV2"
         }
-        response = requests.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=payload)
-        print(f"Telegram response: {response.status_code} - {response.text}")
+        TELEGRAM_BUCKET.acquire()
+        response = TELEGRAM_SESSION.post(url, data=payload, timeout=10)
+        print(f"Telegram response: {response.status_code}")
+        if response.status_code != 200:
+            print(response.text)
         return
     
-    # Split message into chunks
-    lines = text.split('\n')
-    current_chunk = ""
-    chunk_count = 1
-    
-    for line in lines:
+    # Split message into chunks on line boundaries, buffering lines and joining once per chunk
+    buf, buf_len, chunk_count = [], 0, 1
+    for line in text.split('\n'):
+        line_len = len(line) + 1
         # Check if adding this line would exceed the limit
-        if len(current_chunk + line + '\n') > MAX_MESSAGE_LENGTH:
+        if buf and buf_len + line_len > MAX_MESSAGE_LENGTH:
             # Send current chunk if it's not empty
-            if current_chunk.strip():
-                header = f"📱 *Part {chunk_count}*\n\n" if chunk_count > 1 else ""
-                payload = {
-                    "chat_id": CHAT_ID,
-                    "text": header + current_chunk.strip(),
-                    "parse_mode": "MarkdownV2"
-                }
-                response = requests.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=payload)
-                print(f"Telegram response (part {chunk_count}): {response.status_code}")
+            chunk = "\n".join(buf).strip()
+            if chunk:
+                send_telegram_part(url, chunk, chunk_count)
                 chunk_count += 1
-                time.sleep(0.5)  # Small delay between messages
-            
-            # Start new chunk
-            current_chunk = line + '\n'
-        else:
-            current_chunk += line + '\n'
+            buf, buf_len = [], 0
+        buf.append(line)
+        buf_len += line_len
     
     # Send remaining chunk
-    if current_chunk.strip():
-        header = f"📱 *Part {chunk_count}*\n\n" if chunk_count > 1 else ""
-        payload = {
-            "chat_id": CHAT_ID,
-            "text": header + current_chunk.strip(),
-            "parse_mode": "MarkdownV2"
-        }
-        response = requests.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=payload)
-        print(f"Telegram response (part {chunk_count}): {response.status_code}")
+    chunk = "\n".join(buf).strip()
+    if chunk:
+        send_telegram_part(url, chunk, chunk_count)
+
+
+def send_telegram_part(url: str, chunk: str, chunk_count: int):
+    header = f"📱 *Part {chunk_count}*\n\n" if chunk_count > 1 else ""
+    payload = {
+        "chat_id": CHAT_ID,
+        "text": header + chunk,
+        "parse_mode": "MarkdownV2"
+    }
+    TELEGRAM_BUCKET.acquire()
+    response = TELEGRAM_SESSION.post(url, data=payload, timeout=10)
+    print(f"Telegram response (part {chunk_count}): {response.status_code}")
+    if response.status_code != 200:
+        print(response.text)
 
 
 def extract_court_number(label: str) -> int:
@@ -113,7 +181,7 @@ def extract_court_number(label: str) -> int:
     """
     try:
         # Match both "Court" and "Gelanggang"
-        match = re.search(r'(?:Court|Gelanggang)\s+(\d+)', label, re.IGNORECASE)
+        match = COURT_NUM_RE.search(label.lower())
         if match:
             return int(match.group(1))
         return None
@@ -128,9 +196,9 @@ def extract_time_range(label: str):
     """
     try:
         # Normalize spaces and separators
-        clean_label = label.replace(" to ", "-").replace(" - ", "-")
+        clean_label = label.lower().replace(" to ", "-").replace(" - ", "-")
         # Regex to find time range pattern: HH:MM AM/PM - HH:MM AM/PM
-        match = re.search(r'(\d{1,2}:\d{2}\s*[AP]M)\s*-\s*(\d{1,2}:\d{2}\s*[AP]M)', clean_label, re.IGNORECASE)
+        match = TIME_RANGE_RE.search(clean_label)
         if match:
             return match.group(1), match.group(2)
         return None, None
@@ -138,101 +206,248 @@ def extract_time_range(label: str):
         return None, None
 
 
-def is_slot_after_4pm(label: str) -> bool:
-    """Check if slot starts between 7PM and 10PM (inclusive)"""
-    try:
-        start_time, _ = extract_time_range(label)
-        if not start_time:
-            return False
-            
-        dt = parser.parse(start_time)
-        # 7PM onwards (19:00) but before 11PM (23:00)
-        return 19 <= dt.hour < 23
-    except Exception:
-        return False
-
-
-def should_ignore_court(location_id: int, court_number: int) -> bool:
-    """Check if a court should be ignored based on configuration"""
-    if location_id not in IGNORED_COURTS:
-        return False
-    return court_number in IGNORED_COURTS[location_id]
+def parse_slot(label: str) -> dict:
+    """Parse a slot label once into everything the filters and message need
+    Example: 'Court 1 07:00 PM to 08:00 PM' ->
+        {"label": ..., "court": 1, "start_min": 1140, "end_min": 1200}
+    start_min/end_min are None when the label has no time range
+    """
+    start_time, end_time = extract_time_range(label)
+    return {
+        "label": label,
+        "court": extract_court_number(label),
+        "start_min": parse_minutes(start_time) if start_time else None,
+        "end_min": parse_minutes(end_time) if end_time else None,
+    }
+
+
+def extract_slot_labels(html: str) -> list[str]:
+    """Collect the available (not taken) slots of every court tile on a booking page
+    Each label is prefixed with the court number, e.g. 'Court 1 07:00 PM to 08:00 PM'
+    """
+    labels = []
+    for court_item in HTMLParser(html).css("div.item.notranslate"):
+        # Extract court number from the title (supports both COURT and GELANGGANG)
+        title = court_item.css_first("div.item-title")
+        court_num_match = COURT_NUM_RE.search(title.text().lower()) if title else None
+        if not court_num_match:
+            continue
+
+        for label in court_item.css("div.slot:not(.taken) label"):
+            # Collapse whitespace the way innerText would
+            slot_label = " ".join(label.text(separator=" ").split())
+            labels.append(f"Court {court_num_match.group(1)} {slot_label}")
+    return labels
+
+
+async def safe_get(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str, retries=1) -> httpx.Response | None:
+    for attempt in range(retries + 1):
+        try:
+            # Hold a request slot only while the request is in flight, not during the retry sleep
+            async with sem:
+                response = await client.get(url)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPError as e:
+            print(f"❌ Attempt {attempt+1} failed to load {url}: {e}")
+            if attempt < retries:
+                print("🔄 Retrying...")
+                await asyncio.sleep(3)
+    return None
 
 
-def fetch_slots_for_date_and_location(page: Page, location_id: int, date_str: str) -> list[str]:
+async def fetch_slots_for_date_and_location(client: httpx.AsyncClient, sem: asyncio.Semaphore, page_cache: dict, location_id: int, date_str: str) -> list[dict] | None:
+    """Fetch one location/date and return its available slots, or None if the page could not be loaded"""
     try:
-        # Navigate to the target URL for the specific date and location
+        # Fetch the booking page HTML for the specific date and location
         url = TARGET_URL_TEMPLATE.format(location_id, date_str)
-        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-        page.wait_for_timeout(3000)
+        response = await safe_get(client, sem, url)
+        if response is None:
+            return None
 
         # Check if we were redirected to the login page (e.g., session expired)
-        if "sign-in" in page.url:
+        if "sign-in" in str(response.url):
             print("❌ Session expired. Re-login might be needed. Skipping this run.")
             return []
 
-        # New approach: Find each court item and extract court number + slots
-        all_slots = []
-        court_items = page.locator("div.item.notranslate")
-        
-        for i in range(court_items.count()):
-            court_item = court_items.nth(i)
-            
-            # Extract court number from the title (supports both COURT and GELANGGANG)
-            title_text = court_item.locator("div.item-title").inner_text().strip()
-            court_num_match = re.search(r'(?:COURT|GELANGGANG)\s+(\d+)', title_text, re.IGNORECASE)
-            
-            if not court_num_match:
-                continue
-            
-            court_num = court_num_match.group(1)
-            
-            # Find all available slots (not taken) within this court
-            available_slots = court_item.locator("div.slot:not(.taken)")
-            
-            for j in range(available_slots.count()):
-                slot_label = available_slots.nth(j).locator("label").inner_text().strip()
-                # Prepend court number to the slot label
-                full_slot = f"Court {court_num} {slot_label}"
-                all_slots.append(full_slot)
-        
-        return all_slots
+        # Reuse last run's parsed labels when the page HTML is unchanged
+        key = f"{location_id}:{date_str}"
+        page_hash = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        cached = page_cache.get(key)
+        if cached and cached["hash"] == page_hash:
+            labels = cached["labels"]
+        else:
+            labels = extract_slot_labels(response.text)
+            page_cache[key] = {"hash": page_hash, "labels": labels}
+
+        return [parse_slot(label) for label in labels]
     except Exception as e:
         print(f"An error occurred while fetching slots for location {location_id} on {date_str}: {e}")
-        return []
+        return None
 
-def safe_goto(page: Page, url: str, wait_until="domcontentloaded", timeout=15000, retries=1):
+async def safe_goto(page: Page, url: str, wait_until="commit", timeout=15000, retries=1):
     for attempt in range(retries + 1):
         try:
-            page.goto(url, wait_until=wait_until, timeout=timeout)
+            await page.goto(url, wait_until=wait_until, timeout=timeout)
             return True
         except Exception as e:
             print(f"❌ Attempt {attempt+1} failed to load {url}: {e}")
             if attempt < retries:
                 print("🔄 Retrying...")
-                time.sleep(3)
+                await asyncio.sleep(3)
     return False
 
 
-def process_and_notify(all_location_slots):
-    """Process slot data and send notification if there are changes"""
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def build_http_client(cookies: list[dict]) -> httpx.AsyncClient:
+    """HTTP client carrying the cookies of the Playwright login"""
+    jar = httpx.Cookies()
+    for cookie in cookies:
+        jar.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+    return httpx.AsyncClient(
+        cookies=jar,
+        headers={"User-Agent": USER_AGENT},
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS, max_keepalive_connections=MAX_CONCURRENT_REQUESTS),
+        timeout=HTTP_TIMEOUT,
+    )
+
+
+async def fetch_location_date(client: httpx.AsyncClient, sem: asyncio.Semaphore, page_cache: dict, location_id: int, date_str: str) -> list[dict] | None:
+    """Fetch the evening slots for one location/date"""
+    print(f"  🔍 Checking {LOCATIONS[location_id]} {date_str}...")
+    day_slots = await fetch_slots_for_date_and_location(client, sem, page_cache, location_id, date_str)
+    if day_slots is None:
+        return None  # Skip to next date
+
+    # Filter by time and court number
+    ignored = IGNORED_COURTS.get(location_id, EMPTY_FS)
+    filtered = []
+    for slot in day_slots:
+        # Check time filter: 7PM onwards (19:00) but before 11PM (23:00)
+        if slot["start_min"] is None or not 19 * 60 <= slot["start_min"] < 23 * 60:
+            continue
+        
+        # Debug: Print raw slot format (first slot only to avoid spam)
+        if len(filtered) == 0 and day_slots:
+            print(f"    🔍 DEBUG - Raw slot format: '{slot['label']}'")
+        
+        # Check court number filter
+        court_num = slot["court"]
+        if court_num in ignored:
+            print(f"    ⏭️ Ignoring Court {court_num}: {slot['label']}")
+            continue
+        
+        filtered.append(slot)
+
+    return filtered
+
+
+async def crawl_location(client: httpx.AsyncClient, sem: asyncio.Semaphore, page_cache: dict, location_id: int, today: datetime) -> dict:
+    """Fetch one location's dates in concurrent batches, stopping once a streak of days has no evening slots
+    The first batch covers MIN_SCAN_DAYS, later batches EARLY_STOP_STREAK days each
+    """
+    location_slots = {}
+    empty_streak = 0
+
+    # Apply -1 day offset for Titiwangsa only
+    day_offset = -1 if location_id == 10 else 0
+    dates = [today + timedelta(days=i + day_offset) for i in range(MAX_BOOKING_DAYS)]
+
+    start, batch_size = 0, MIN_SCAN_DAYS
+    while start < len(dates):
+        batch = dates[start:start + batch_size]
+        results = await asyncio.gather(*[
+            fetch_location_date(client, sem, page_cache, location_id, date.strftime("%Y-%m-%d"))
+            for date in batch
+        ])
+
+        for date, filtered in zip(batch, results):
+            if filtered is None:
+                continue  # Page failed to load, neither evidence of slots nor of an empty day
+
+            if filtered:
+                location_slots[date.strftime("%d/%m/%Y")] = filtered
+                empty_streak = 0
+            else:
+                empty_streak += 1
+
+        if empty_streak >= EARLY_STOP_STREAK:
+            print(f"  ⏹️ {LOCATIONS[location_id]}: {empty_streak} empty days in a row, skipping the remaining dates")
+            break
+
+        start, batch_size = start + len(batch), EARLY_STOP_STREAK
+
+    return location_slots
+
+
+def load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def write_json(path: str, data):
+    """Write JSON via a temp file + rename so a crash never leaves a half-written state file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def slot_list_hash(slots) -> str:
+    return hashlib.blake2b("\n".join(sorted(slots)).encode(), digest_size=16).hexdigest()
+
+
+def load_slot_cache() -> dict:
+    """Load the per-(location, date) slot cache: {"location_id|date": {"hash": ..., "slots": [...]}}"""
+    cache = load_json(SLOT_FILE, {})
+    # Older runs stored a flat list of slot strings
+    return cache if isinstance(cache, dict) else {}
+
+
+def build_slot_cache(all_location_slots) -> dict:
+    slot_cache = {}
+    for location_id, location_data in all_location_slots.items():
+        for date, slots in location_data.items():
+            labels = [slot["label"] for slot in slots]
+            slot_cache[f"{location_id}|{date}"] = {"hash": slot_list_hash(labels), "slots": labels}
+    return slot_cache
+
+
+def flatten_slot_cache(slot_cache) -> set[str]:
+    """Flatten the slot cache into "Location - date - slot" strings for diffing"""
+    flat = set()
+    for key, cell in slot_cache.items():
+        location_id, date = key.split("|", 1)
+        prefix = f"{LOCATIONS.get(int(location_id), location_id)} - {date} - "
+        flat.update(prefix + slot for slot in cell["slots"])
+    return flat
+
+
+def process_and_notify(all_location_slots, previous_cache, slot_cache):
+    """Build and send the notification; run() only calls this once a location/date hash changed"""
     
     # Create a flattened set for comparison (including location info)
-    if os.path.exists(SLOT_FILE):
-        with open(SLOT_FILE, "r") as f:
-            previous_slots = set(json.load(f))
-    else:
-        previous_slots = set()
+    previous_slots = flatten_slot_cache(previous_cache)
 
     current_slots = set()
     for location_id, location_data in all_location_slots.items():
+        location_name = LOCATIONS[location_id]
         for date, slots in location_data.items():
-            for slot in slots:
-                current_slots.add(f"{LOCATIONS[location_id]} - {date} - {slot}")
+            prefix = f"{location_name} - {date} - "
+            current_slots.update(prefix + slot["label"] for slot in slots)
 
     new_slots = current_slots - previous_slots
     removed_slots = previous_slots - current_slots
-
     print(f"🆕 {len(new_slots)} new | 🗑️ {len(removed_slots)} removed")
 
     # Build the message with court grouping for better readability
@@ -247,71 +462,38 @@ def process_and_notify(all_location_slots):
     
     for location_id, location_data in all_location_slots.items():
         location_name = LOCATIONS[location_id]
-        message_lines.append(f"*{escape_md_v2(location_name)}*")
+        message_lines.append(f"*{ESCAPED_LOCATIONS[location_id]}*")
         
-        for display_date, slots in sorted(location_data.items(), key=lambda item: datetime.strptime(item[0], "%d/%m/%Y")):
+        for display_date, slots in sorted(location_data.items(), key=lambda item: parse_display_date(item[0])):
             # More compact date format
-            date_obj = datetime.strptime(display_date, "%d/%m/%Y")
+            date_obj = parse_display_date(display_date)
             short_date = date_obj.strftime("%d/%m")
             day_name = date_obj.strftime("%a")
             
-            # Group slots by time slot (not by court)
-            time_groups = {}
+            # Group slots by (start, end) minutes (not by court); the key sorts by start time directly
+            time_groups = defaultdict(list)
             for slot in slots:
-                flat_key = f"{location_name} - {display_date} - {slot}"
-                court_num = extract_court_number(slot)
-                
-                # Extract time only (remove court prefix)
-                time_only = re.sub(r'(?:Court|Gelanggang)\s+\d+\s*', '', slot, flags=re.IGNORECASE).strip()
-                
+                flat_key = f"{location_name} - {display_date} - {slot['label']}"
                 is_new = flat_key in new_slots
                 
-                if time_only not in time_groups:
-                    time_groups[time_only] = []
-                time_groups[time_only].append((court_num, is_new))
+                if slot["court"] is not None:
+                    time_groups[(slot["start_min"], slot["end_min"])].append((slot["court"], is_new))
             
             # Format date line
             message_lines.append(f"\n`{short_date} {day_name}`")
             
-            # Format each time slot group
-            # Sort by start time
-            sorted_slots = []
-            for time_slot in time_groups.keys():
-                # Extract clean time for sorting
-                # time_slot format is likely "7:00 PM - 9:00 PM" (from regex extraction) or original slot
-                # But time_groups keys came from "time_only" extraction which preserves original separators? 
-                # Actually earlier: time_only = re.sub(..., '', slot).strip() -> "7:00 PM - 9:00 PM"
-                start, _ = extract_time_range(time_slot)
-                if start:
-                    dt = parser.parse(start)
-                    sorted_slots.append((dt, time_slot))
-            
-            sorted_slots.sort(key=lambda x: x[0])
-            
-            for _, time_slot in sorted_slots:
-                courts = time_groups[time_slot]
+            # Format each time slot group, sorted by start time
+            for (start_min, end_min), courts in sorted(time_groups.items()):
                 court_strings = []
-                for court_num, is_new in sorted(courts, key=lambda x: x[0] if x[0] is not None else 999):
-                    if court_num is not None:
-                        if is_new:
-                            court_strings.append(f"{court_num}🆕")
-                        else:
-                            court_strings.append(str(court_num))
+                for court_num, is_new in sorted(courts):
+                    if is_new:
+                        court_strings.append(f"{court_num}🆕")
+                    else:
+                        court_strings.append(str(court_num))
                 
+                # Court numbers, "🆕" and ", " contain nothing MarkdownV2 needs escaped
                 courts_text = ", ".join(court_strings)
-                
-                # Format time nicely
-                start_str, end_str = extract_time_range(time_slot)
-                if start_str and end_str:
-                    try:
-                        start_fmt = parser.parse(start_str).strftime("%I:%M %p").lstrip("0")
-                        end_fmt = parser.parse(end_str).strftime("%I:%M %p").lstrip("0")
-                        message_lines.append(f"• {escape_md_v2(start_fmt)} \\- {escape_md_v2(end_fmt)} → {escape_md_v2(courts_text)}")
-                    except:
-                        # Fallback if parsing fails
-                        message_lines.append(f"• {escape_md_v2(time_slot)} → {escape_md_v2(courts_text)}")
-                else:
-                    message_lines.append(f"• {escape_md_v2(time_slot)} → {escape_md_v2(courts_text)}")
+                message_lines.append(f"• {format_minutes_md(start_min)} \\- {format_minutes_md(end_min)} → {courts_text}")
         
         message_lines.append("")  # Space between locations
     
@@ -333,116 +515,122 @@ def process_and_notify(all_location_slots):
     
     message_lines.append("[🔗 Book](https://tempahkl.dbkl.gov.my)")
     message = "\n".join(message_lines)
-    message_hash = hashlib.md5(message.encode()).hexdigest()
 
-    if os.path.exists(HASH_FILE):
-        with open(HASH_FILE, "r") as f:
-            last_hash = json.load(f)
-    else:
-        last_hash = {}
-
-    if last_hash.get("hash") != message_hash:
-        send_telegram_message(message)
-        print("📤 Message sent to Telegram.")
-        with open(HASH_FILE, "w") as f:
-            json.dump({"hash": message_hash}, f, indent=2)
-        with open(SLOT_FILE, "w") as f:
-            json.dump(sorted(current_slots), f, indent=2)
-    else:
-        print("🔇 No changes in slot availability.")
+    send_telegram_message(message)
+    print("📤 Message sent to Telegram.")
+    write_json(SLOT_FILE, slot_cache)
+
+
+async def login() -> dict | None:
+    """Log in with Playwright and save the session to AUTH_FILE; returns its storage_state"""
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=["--disable-dev-shm-usage", "--no-sandbox"])
+        session = await browser.new_context(user_agent=USER_AGENT)
+        session.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+        await session.route("**/*", block_heavy_resources)
+        page = await session.new_page()
+
+        print("🔑 Logging in...")
+        if not await safe_goto(page, SIGN_IN_URL):
+            print("⚠️ Login page not reachable. Skipping this run.")
+            await browser.close()
+            return None
+        await page.fill('input[name="email"]', DBKL_USER)
+        await page.fill('input[name="password"]', DBKL_PASS)
+        await page.click('button[type="submit"]')
+        try:
+            await page.wait_for_selector("a[href='/logout']", timeout=15000)
+            print("✅ Login successful.")
+        except:
+            print("⚠️ Login failed or timed out.")
+            await browser.close()
+            return None
+
+        # Save the logged-in session for the next run; the browser is only needed for login
+        storage_state = await session.storage_state(path=AUTH_FILE)
+        await browser.close()
+        return storage_state
+
+
+async def ensure_session() -> dict | None:
+    """Reuse the saved session when DBKL still accepts it, otherwise log in again
+    Checking the saved cookies is a single HTTP request, so Chromium only starts when the session expired
+    """
+    print("Checking session and logging in if necessary...")
+    storage_state = load_json(AUTH_FILE, None)
+    if storage_state is None:
+        return await login()
 
+    async with build_http_client(storage_state["cookies"]) as client:
+        try:
+            response = await client.get(FACILITY_URL)
+        except httpx.HTTPError as e:
+            print(f"⚠️ Could not load facility page ({e}). Skipping this run.")
+            return None
+
+    if "sign-in" in str(response.url):
+        return await login()
+
+    print("✅ Saved session still valid.")
+    return storage_state
 
-def run():
+
+async def run():
     today = datetime.today()
     all_location_slots = {}
 
     try:
-        with sync_playwright() as p:
-            user_data_dir = "playwright_session"
-            browser = p.chromium.launch_persistent_context(user_data_dir, headless=True)
-            page = browser.new_page()
-
-            print("Checking session and logging in if necessary...")
-
-            if not safe_goto(page, "https://tempahkl.dbkl.gov.my/facility", retries=1):
-                print("⚠️ Could not load facility page. Skipping this run.")
-                browser.close()
-                return
-
-            if "sign-in" in page.url:
-                print("🔑 Logging in...")
-                if not safe_goto(page, "https://tempahkl.dbkl.gov.my/sign-in"):
-                    print("⚠️ Login page not reachable. Skipping this run.")
-                    browser.close()
-                    return
-                page.fill('input[name="email"]', DBKL_USER)
-                page.fill('input[name="password"]', DBKL_PASS)
-                page.click('button[type="submit"]')
-                try:
-                    page.wait_for_selector("a[href='/logout']", timeout=15000)
-                    print("✅ Login successful.")
-                except:
-                    print("⚠️ Login failed or timed out.")
-                    browser.close()
-                    return
-
-            for location_id, location_name in LOCATIONS.items():
-                print(f"\n🏟️ Checking {location_name} (ID: {location_id})...")
-                location_slots = {}
-                
-                # Apply -1 day offset for Titiwangsa only
-                day_offset = -1 if location_id == 10 else 0
-                
-                for i in range(MAX_BOOKING_DAYS):
-                    date = today + timedelta(days=i + day_offset)
-                    date_str = date.strftime("%Y-%m-%d")
-                    display_date = date.strftime("%d/%m/%Y")
-
-                    print(f"  🔍 Checking {display_date}...")
-                    url = TARGET_URL_TEMPLATE.format(location_id, date_str)
-                    if not safe_goto(page, url):
-                        continue  # Skip to next date
-
-                    day_slots = fetch_slots_for_date_and_location(page, location_id, date_str)
-                    
-                    # Filter by time and court number
-                    filtered = []
-                    for slot in day_slots:
-                        # Check time filter
-                        if not is_slot_after_4pm(slot):
-                            continue
-                        
-                        # Debug: Print raw slot format (first slot only to avoid spam)
-                        if len(filtered) == 0 and day_slots:
-                            print(f"    🔍 DEBUG - Raw slot format: '{slot}'")
-                        
-                        # Check court number filter
-                        court_num = extract_court_number(slot)
-                        if court_num is not None and should_ignore_court(location_id, court_num):
-                            print(f"    ⏭️ Ignoring Court {court_num}: {slot}")
-                            continue
-                        
-                        filtered.append(slot)
-
-                    if filtered:
-                        location_slots[display_date] = filtered
-
-                if location_slots:
-                    all_location_slots[location_id] = location_slots
-
-            browser.close()
+        storage_state = await ensure_session()
+        if storage_state is None:
+            return
+
+        # Fetch the booking pages directly with the session cookies, all locations at once
+        # HTTP/2 multiplexes requests over few connections, so the semaphore is what bounds concurrency
+        sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        page_cache = load_json(PAGE_HASH_FILE, {})
+        async with build_http_client(storage_state["cookies"]) as client:
+            print(f"\n🏟️ Checking {len(LOCATIONS)} locations ({MAX_CONCURRENT_REQUESTS} requests at a time)...")
+            results = await asyncio.gather(*[
+                crawl_location(client, sem, page_cache, location_id, today)
+                for location_id in LOCATIONS
+            ])
+
+        # Drop pages for dates that can no longer be booked (Titiwangsa starts a day early)
+        oldest_date = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+        write_json(PAGE_HASH_FILE, {
+            key: page for key, page in page_cache.items()
+            if key.split(":", 1)[1] >= oldest_date
+        })
 
     except Exception as e:
         print(f"💥 Unexpected error during run: {e}")
         return
 
+    for location_id, location_slots in zip(LOCATIONS, results):
+        if location_slots:
+            all_location_slots[location_id] = location_slots
+
     if not all_location_slots:
         print("❌ No available slots found after 5 PM at any location.")
         return
 
-    process_and_notify(all_location_slots)
+    # The one change gate: compare each (location, date) against the last sent run before any formatting work
+    previous_cache = load_slot_cache()
+    slot_cache = build_slot_cache(all_location_slots)
+    changed_cells = [
+        key for key, cell in slot_cache.items()
+        if previous_cache.get(key, {}).get("hash") != cell["hash"]
+    ]
+    dropped_cells = previous_cache.keys() - slot_cache.keys()
+    if not changed_cells and not dropped_cells:
+        print("🔇 No changes in slot availability.")
+        return
+
+    print(f"🔄 {len(changed_cells)} changed | {len(dropped_cells)} emptied location/date pages")
+    # Sending uses blocking requests/sleeps, so keep it off the event loop (shared with PJ in main.py)
+    await asyncio.to_thread(process_and_notify, all_location_slots, previous_cache, slot_cache)
 
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    asyncio.run(run())
\ No newline at end of file
@@ -0,0 +1,66 @@
+import asyncio
+import importlib.util
+import os
+import schedule
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(module_name, file_name):
+    """Import one of the hyphenated *-court-booking.py scripts as a module"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(BASE_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+kl = load_script("kl_court_booking", "kl-court-booking.py")
+pj = load_script("pj_court_booking", "pj-court-booking.py")
+
+
+async def run_dbkl():
+    # The DBKL crawl builds its own client from the saved login cookies, which change on re-login
+    try:
+        await kl.run()
+    except Exception as e:
+        # One scraper failing must not stop the other's schedule
+        print(f"💥 DBKL run failed: {e}")
+
+
+async def run_pj(client):
+    try:
+        await pj.run_all_sports(client)
+    except Exception as e:
+        print(f"💥 PJ run failed: {e}")
+
+
+async def main_loop():
+    # One process for both scripts: modules are imported once and the PJ client keeps its connections warm
+    async with pj.build_http_client() as pj_client:
+        # Run now
+        await asyncio.gather(run_dbkl(), run_pj(pj_client))
+
+        # Jobs only flag a run so it can be awaited on this loop
+        dbkl_due = asyncio.Event()
+        pj_due = asyncio.Event()
+        schedule.every().hour.at(":00").do(dbkl_due.set)
+        for at in ("00:00", "06:00", "12:00", "18:00"):
+            schedule.every().day.at(at).do(pj_due.set)
+
+        print("🔁 Bot running. Press Ctrl+C to stop.")
+        while True:
+            schedule.run_pending()
+            jobs = []
+            if dbkl_due.is_set():
+                dbkl_due.clear()
+                jobs.append(run_dbkl())
+            if pj_due.is_set():
+                pj_due.clear()
+                jobs.append(run_pj(pj_client))
+            if jobs:
+                await asyncio.gather(*jobs)
+            await asyncio.sleep(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_loop())
@@ -1,14 +1,22 @@
-import requests
+import httpx
+import orjson
+import asyncio
 import schedule
-import time
 from datetime import datetime, timedelta
 from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
 import re
 import os
+from rate_limit import TELEGRAM_BUCKET
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 API_URL = os.getenv("API_URL")
+MAX_CONCURRENT_REQUESTS = 15  # Don't flood the MBPJ API / trip its rate limiter
+
+# Strips everything up to the court prefix, e.g. "Gelanggang Badminton 3" -> "3"
+COURT_PREFIX_RE = re.compile(r'.*?(Court\s*|Gelanggang\s*Badminton\s*)', re.IGNORECASE)
 
 ACTIVITY_THREAD_IDS = {
     "Tennis": 32,
@@ -31,35 +39,81 @@ SPORT_TYPES = {
     ]
 }
 
-def send_telegram_message(text, thread_id):
-    max_length = 4000
-    for i in range(0, len(text), max_length):
-        chunk = text[i:i + max_length]
-        payload = {
-            "chat_id": CHAT_ID,
-            "message_thread_id": thread_id,
-            "text": chunk,
-            "parse_mode": "Markdown"
-        }
-        requests.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=payload)
-
-def fetch_slots(location, config, date):
-    date_str = date.strftime("%Y-%m-%d")
-    display_date_str = date.strftime("%d/%m/%Y")
+@lru_cache(maxsize=None)
+def format_time(hhmm):
+    """'19:00' -> '7:00 PM'; slot times come from a small fixed set"""
+    return datetime.strptime(hhmm, "%H:%M").strftime("%I:%M %p").lstrip("0")
+
+def split_message(text, max_length=4000):
+    return [text[i:i + max_length] for i in range(0, len(text), max_length)]
+
+async def send_telegram_chunk(client, thread_id, chunk, max_attempts=3):
     payload = {
+        "chat_id": CHAT_ID,
+        "message_thread_id": thread_id,
+        "text": chunk,
+        "parse_mode": "Markdown"
+    }
+    for _ in range(max_attempts):
+        await TELEGRAM_BUCKET.acquire_async()
+        try:
+            response = await client.post(f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage", data=payload)
+        except httpx.HTTPError as e:
+            print(f"❌ Telegram error for thread {thread_id}:", e)
+            return
+        if response.status_code != 429:
+            return
+        # Telegram says exactly how long to back off
+        retry_after = orjson.loads(response.content).get("parameters", {}).get("retry_after", 1)
+        print(f"⏳ Telegram rate limit hit, retrying in {retry_after}s")
+        await asyncio.sleep(retry_after)
+    print(f"❌ Telegram still rate limited after {max_attempts} attempts, dropped a message part for thread {thread_id}")
+
+async def send_telegram_thread(client, thread_id, chunks):
+    # One at a time, so a retried part can't be overtaken by the parts after it
+    for chunk in chunks:
+        await send_telegram_chunk(client, thread_id, chunk)
+
+async def send_telegram_messages(messages):
+    """Send (thread_id, chunk) pairs; threads go out concurrently, each thread's chunks in order
+    The token bucket keeps the combined rate within Telegram's limit
+    """
+    by_thread = defaultdict(list)
+    for thread_id, chunk in messages:
+        by_thread[thread_id].append(chunk)
+    # Separate from the PJ client, which skips certificate checks
+    async with httpx.AsyncClient(timeout=10) as client:
+        await asyncio.gather(*(send_telegram_thread(client, thread_id, chunks) for thread_id, chunks in by_thread.items()))
+
+def build_payload_template(config):
+    """Search payload for one court; only the dates change between requests"""
+    return {
         "ETID": config["ETID"],
         "FSITEID": config["FSITEID"],
         "FTYPEID": config["FTYPEID"],
         "FITEMID": 0,
-        "CKIDATE": date_str,
-        "CKODATE": date_str,
         "STARTTIME": "07:00",
         "ENDTIME": "23:00",
         "SEARCHMODE": "ONLINE"
     }
+
+def build_http_client():
+    """HTTP/2 client for the PJ API; a run's requests share a few kept-alive connections"""
+    return httpx.AsyncClient(
+        verify=False,
+        timeout=30,
+        http2=True,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS, max_keepalive_connections=MAX_CONCURRENT_REQUESTS),
+    )
+
+async def fetch_slots(client, sem, location, payload_template, date):
+    date_str = date.strftime("%Y-%m-%d")
+    display_date_str = date.strftime("%d/%m/%Y")
+    payload = {**payload_template, "CKIDATE": date_str, "CKODATE": date_str}
     try:
-        response = requests.post(API_URL, json=payload, verify=False)
-        slots = response.json()
+        async with sem:
+            response = await client.post(API_URL, json=payload)
+        slots = orjson.loads(response.content)
         return [
             {
                 "date": display_date_str,
@@ -72,62 +126,95 @@ def fetch_slots(location, config, date):
             for slot in slots
             if slot.get("ISBOOKED") == 0 and int(slot.get("STARTTIME", "00:00")[:2]) >= 19
         ]
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         print(f"❌ Error for {location}:", e)
         return []
 
-def run_all_sports():
+async def run_all_sports(client):
     today = datetime.today()
     days_to_check = 30
+    # Every activity's message is sent together once all of them are built
+    messages = []
+    # HTTP/2 multiplexes requests over few connections, so the semaphore is what bounds concurrency
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
     for activity, courts in SPORT_TYPES.items():
         thread_id = ACTIVITY_THREAD_IDS.get(activity)
         start_date = today.strftime("%d/%m/%Y")
         end_date = (today + timedelta(days=days_to_check)).strftime("%d/%m/%Y")
 
-        # Group by location -> date -> (start, end) -> list of courts
-        grouped = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        # (location, date, start, end) -> list of courts; nested into sections only when rendering
+        grouped = defaultdict(list)
 
-        for i in range(days_to_check):
-            date = today + timedelta(days=i)
-            for court in courts:
-                slots = fetch_slots(court["location"], court, date)
-                for slot in slots:
-                    key = (slot["start"], slot["end"])
-                    grouped[slot["location"]][slot["date"]][key].append(slot["name"])
+        # Court fields don't change per date, so build their payloads once
+        court_payloads = [(court["location"], build_payload_template(court)) for court in courts]
+
+        # Fetch every (date, court) pair concurrently; results come back in task order
+        tasks = [
+            fetch_slots(client, sem, location, payload_template, today + timedelta(days=i))
+            for i in range(days_to_check)
+            for location, payload_template in court_payloads
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
-        msg = f"🎯 *{activity}* availability from ({start_date} - {end_date}):\n"
+        for slots in results:
+            if isinstance(slots, Exception):
+                print(f"❌ Error for {activity}:", slots)
+                continue
+            for slot in slots:
+                grouped[(slot["location"], slot["date"], slot["start"], slot["end"])].append(slot["name"])
+
+        parts = [f"🎯 *{activity}* availability from ({start_date} - {end_date}):\n"]
 
         if grouped:
-            for location, dates in grouped.items():
-                msg += f"\n📍 *{location}*"
-                for date, timeslots in dates.items():
-                    msg += f"\n\n📅 {date}"
-                    for (start, end), courts in timeslots.items():
-                        start_time = datetime.strptime(start, "%H:%M").strftime("%I:%M %p").lstrip("0")
-                        end_time = datetime.strptime(end, "%H:%M").strftime("%I:%M %p").lstrip("0")
+            # Locations and dates in first-seen order; sorted() is stable so times keep their fetch order
+            location_order = {location: i for i, location in enumerate(dict.fromkeys(key[0] for key in grouped))}
+            date_order = {date: i for i, date in enumerate(dict.fromkeys(key[1] for key in grouped))}
+            keys = sorted(grouped, key=lambda key: (location_order[key[0]], date_order[key[1]]))
+            for location, location_keys in groupby(keys, key=lambda key: key[0]):
+                parts.append(f"\n📍 *{location}*")
+                for date, date_keys in groupby(location_keys, key=lambda key: key[1]):
+                    parts.append(f"\n\n📅 {date}")
+                    for key in date_keys:
+                        _, _, start, end = key
+                        courts = grouped[key]
+                        start_time = format_time(start)
+                        end_time = format_time(end)
                         time_range = f"{start_time} - {end_time}"
-                        courts_str = ", ".join(sorted({re.sub(r'.*?(Court\s*|Gelanggang\s*Badminton\s*)', '', c, flags=re.IGNORECASE) for c in courts}))
-                        msg += f"\n• {time_range} → {courts_str}"
-                 
-                msg += "\n--------------------\n\n"
+                        courts_str = ", ".join(sorted({COURT_PREFIX_RE.sub('', c) for c in courts}))
+                        parts.append(f"\n• {time_range} → {courts_str}")
+
+                parts.append("\n--------------------\n\n")
         else:
-            msg += "No session found."
+            parts.append("No session found.")
+
+        parts.append("Check now: https://mypjtempahan.mbpj.gov.my/")
+        parts.append("\n\nNext check running in next hour...")
+        msg = "".join(parts)
+        messages.extend((thread_id, chunk) for chunk in split_message(msg))
+
+    await send_telegram_messages(messages)
 
-        msg += "Check now: https://mypjtempahan.mbpj.gov.my/"
-        msg += "\n\nNext check running in next hour..."
-        send_telegram_message(msg, thread_id)
+async def main():
+    # One client for the whole process so keep-alive connections are reused across runs
+    async with build_http_client() as client:
+        # Run now
+        await run_all_sports(client)
 
-# Run now
-run_all_sports()
+        # Schedule hourly; jobs only flag a run so it can be awaited on this loop's client
+        run_due = asyncio.Event()
+        schedule.every().day.at("00:00").do(run_due.set)
+        schedule.every().day.at("06:00").do(run_due.set)
+        schedule.every().day.at("12:00").do(run_due.set)
+        schedule.every().day.at("18:00").do(run_due.set)
 
-# Schedule hourly
-schedule.every().day.at("00:00").do(run_all_sports)
-schedule.every().day.at("06:00").do(run_all_sports)
-schedule.every().day.at("12:00").do(run_all_sports)
-schedule.every().day.at("18:00").do(run_all_sports)
+        print("🔁 Bot running. Press Ctrl+C to stop.")
+        while True:
+            schedule.run_pending()
+            if run_due.is_set():
+                run_due.clear()
+                await run_all_sports(client)
+            await asyncio.sleep(1)
 
-print("🔁 Bot running. Press Ctrl+C to stop.")
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Rate limiter; Telegram allows about 1 message per second per chat"""
+
+    def __init__(self, rate: float = 1.0, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+        # kl sends from a worker thread while pj sends on the event loop
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, going into debt if none is left; returns how long to wait before sending"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def acquire_async(self):
+        # Reserving before awaiting keeps concurrent senders spaced out
+        await asyncio.sleep(self.reserve())
+
+
+# Both scrapers post to the same chat, so they share one bucket when run in one process
+TELEGRAM_BUCKET = TokenBucket()